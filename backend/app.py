@@ -1,44 +1,205 @@
 """
 Flask Backend API for EMI Payment Predictor
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import sys
+import threading
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date
+from functools import lru_cache
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
-from predictor import EMIPaymentPredictor
+from predictor import EMIPaymentPredictor, find_model_path
+from data_processor import EMIDataProcessor
 from llm_explainer import LLMExplainer
-from config import DATA_PATH, MODEL_PATH
+from config import DATA_PATH, MODEL_PATH, PREDICTION_CACHE_SIZE
 
 # Update paths to be relative to project root
 MODEL_PATH = os.path.join(parent_dir, MODEL_PATH) if not os.path.isabs(MODEL_PATH) else MODEL_PATH
 DATA_PATH = os.path.join(parent_dir, DATA_PATH) if not os.path.isabs(DATA_PATH) else DATA_PATH
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes responses with orjson (compiled, numpy-aware)"""
+    
+    def dumps(self, obj, **kwargs):
+        # Types orjson does not know (e.g. pandas Timestamps) fall back to Flask's encoder
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if ORJSON_AVAILABLE:
+    app.json = ORJSONProvider(app)
 CORS(app)  # Enable CORS for frontend
 
-# Initialize predictor
+# Initialize predictor; replaced as a whole (never mutated) under _predictor_lock
 predictor = None
 explainer = None
+_predictor_lock = threading.RLock()
+# Version (mtime) of the model file the predictor was loaded from; a newer file, e.g. one
+# saved by /api/train in another worker process, is picked up by get_predictor
+_predictor_mtime = None
+data_processor = EMIDataProcessor()
+
+class DataVersion:
+    """One version of the payment history file and what is derived from it (treat as read-only)
+    
+    Replaced as a whole when the file changes, so everything read from one instance
+    is consistent. Hashed by identity, so it can key caches of results computed from it.
+    """
+    
+    def __init__(self, mtime, df):
+        self.mtime = mtime
+        self.df = df
+        # Prepared once (dates, delays, narrow dtypes) for predictions, with each customer's
+        # row positions, so one customer's rows are sliced instead of found by a full scan
+        self.prepared = data_processor.prepare_data(df)
+        self.row_indices = self.prepared.groupby('customer_id', sort=False, observed=True).indices
+        self.customer_stats = None
+
+# Parsed payment history, re-read only when the data file changes on disk
+_data = None
+_data_lock = threading.Lock()
+
+def _load_cached_data():
+    """Refresh the payment history cache if the data file changed and return the current DataVersion"""
+    global _data
+    mtime = os.stat(DATA_PATH).st_mtime
+    with _data_lock:
+        if _data is None or _data.mtime != mtime:
+            df = data_processor.read_history(DATA_PATH)
+            if not pd.api.types.is_datetime64_any_dtype(df['payment_date']):
+                df['payment_date'] = pd.to_datetime(df['payment_date'])
+            _data = DataVersion(mtime, df)
+            # Predictions from older versions are never asked for again
+            _predict_cached.cache_clear()
+        return _data
+
+def get_data():
+    """Return the cached payment history DataFrame (treat it as read-only)"""
+    return _load_cached_data().df
+
+def get_customer_rows(customer_id):
+    """Return one customer's payment rows in date order, with the data file's columns (None if unknown)"""
+    data = _load_cached_data()
+    rows = data.row_indices.get(customer_id)
+    if rows is None:
+        return None
+    # Prepared rows keep the raw frame's labels; read values from the raw frame so amounts stay float64
+    return data.df.loc[data.prepared.index[rows]]
+
+def get_customer_stats():
+    """Return per-customer payment counts and first/last payment dates, computed once per data version"""
+    data = _load_cached_data()
+    with _data_lock:
+        if data.customer_stats is None:
+            # Only the id and payment date columns are touched, in a single grouped pass
+            stats = data.df.groupby('customer_id', sort=False, observed=True)['payment_date'].agg(
+                total_payments='size',
+                last_payment='max',
+                first_payment='min'
+            ).reset_index()
+            for column in ('last_payment', 'first_payment'):
+                stats[column] = stats[column].dt.strftime('%Y-%m-%d')
+            data.customer_stats = stats.to_dict('records')
+        return data.customer_stats
+
+def _model_mtime():
+    """Modification time of the saved model file (None if there is none)"""
+    try:
+        return os.stat(MODEL_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
 def init_predictor():
     """Initialize the predictor model"""
-    global predictor, explainer
-    try:
-        predictor = EMIPaymentPredictor()
-        # Use the fixed MODEL_PATH from this module
-        predictor.load_model(MODEL_PATH)
-        explainer = LLMExplainer()
-        return True
-    except Exception as e:
-        print(f"Error initializing predictor: {e}")
-        return False
+    global predictor, explainer, _predictor_mtime
+    with _predictor_lock:
+        try:
+            loaded = EMIPaymentPredictor()
+            mtime = _model_mtime()
+            # Use the fixed MODEL_PATH from this module
+            loaded.load_model(MODEL_PATH)
+            predictor = loaded
+            _predictor_mtime = mtime
+            if explainer is None:
+                explainer = LLMExplainer()
+            _predict_cached.cache_clear()
+            return True
+        except Exception as e:
+            print(f"Error initializing predictor: {e}")
+            return False
+
+def _predictor_stale():
+    """Whether the predictor is missing or older than the saved model file"""
+    mtime = _model_mtime()
+    return predictor is None or (mtime is not None and mtime != _predictor_mtime)
+
+def get_predictor():
+    """Return the shared predictor, (re)loading it when the model file changes (None if no model is available)"""
+    if _predictor_stale():
+        with _predictor_lock:
+            # Another thread may have loaded it while we waited for the lock
+            if _predictor_stale():
+                init_predictor()
+    return predictor
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def _predict_cached(model_predictor, customer_id, data, today):
+    """Prediction for one customer, memoised per predictor, DataVersion and day
+    
+    The prediction is computed from ``data`` itself, so it is never stored under a
+    version other than the one it was computed from.
+    """
+    return model_predictor.predict_from_prepared(customer_id, data.prepared, data.row_indices)
+
+def format_payment_history(payment_history):
+    """A prediction's payment history with dates as YYYY-MM-DD strings, as the history endpoint sends them
+    
+    Every response then carries the same wire format, whichever encoder writes it.
+    """
+    return [{**payment, 'payment_date': None if pd.isna(payment['payment_date'])
+             else payment['payment_date'].strftime('%Y-%m-%d')}
+            for payment in payment_history]
+
+def predict_customer(customer_id):
+    """Predict one customer, reusing the result while the model, data and date are unchanged"""
+    # Copy so callers can add fields without touching the cached result
+    result = dict(_predict_cached(get_predictor(), customer_id, _load_cached_data(), date.today()))
+    result['payment_history'] = format_payment_history(result['payment_history'])
+    return result
+
+def records_response(payload, key, records_df):
+    """JSON response of `payload` plus a `key` field holding `records_df` as a list of records
+    
+    The records are encoded directly by pandas' C serializer instead of being
+    materialised as Python dicts first.
+    """
+    records_json = records_df.to_json(orient='records', date_format='iso', date_unit='s')
+    body = app.json.dumps(payload)
+    separator = ',' if payload else ''
+    body = f'{body[:-1]}{separator}"{key}":{records_json}}}'
+    return app.response_class(body, mimetype='application/json')
+
+def create_app():
+    """App factory for WSGI servers: load the model and data before serving"""
+    if os.path.exists(find_model_path(MODEL_PATH)):
+        init_predictor()
+    get_data()
+    return app
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -60,12 +221,11 @@ def predict_payment():
         if not customer_id:
             return jsonify({'error': 'customer_id is required'}), 400
         
-        if predictor is None:
-            if not init_predictor():
-                return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
+        if get_predictor() is None:
+            return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
         
         # Predict
-        result = predictor.predict_next_payment_date(customer_id, DATA_PATH)
+        result = predict_customer(customer_id)
         
         # Always add LLM explanation (core feature)
         try:
@@ -87,6 +247,63 @@ def predict_payment():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/predict/<customer_id>', methods=['GET'])
+def predict_payment_quick(customer_id):
+    """Predict payment date for a customer from the resident model and data, without LLM"""
+    try:
+        if get_predictor() is None:
+            return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
+        
+        return jsonify({
+            'success': True,
+            'prediction': predict_customer(customer_id)
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict/stream', methods=['POST'])
+def predict_payment_stream():
+    """Predict payment date for a customer, streaming the LLM explanation as server-sent events
+    
+    Emits one `prediction` event with the result, `explanation` events carrying
+    JSON-encoded text fragments as the LLM produces them, then a `done` event.
+    """
+    try:
+        data = request.json
+        customer_id = data.get('customer_id')
+        
+        if not customer_id:
+            return jsonify({'error': 'customer_id is required'}), 400
+        
+        if get_predictor() is None:
+            return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
+        
+        result = predict_customer(customer_id)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def events():
+        yield f"event: prediction\ndata: {app.json.dumps(result)}\n\n"
+        try:
+            if explainer:
+                fragments = explainer.explain_prediction_stream(result)
+            else:
+                fragments = ["LLM explainer not available"]
+            for fragment in fragments:
+                yield f"event: explanation\ndata: {app.json.dumps(fragment)}\n\n"
+        except Exception as e:
+            yield f"event: explanation\ndata: {app.json.dumps(f'LLM explanation error: {str(e)}')}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/predict/batch', methods=['POST'])
 def predict_batch():
     """Predict payment dates for multiple customers"""
@@ -95,18 +312,32 @@ def predict_batch():
         customer_ids = data.get('customer_ids', [])
         use_llm = data.get('use_llm', False)
         
+        history = _load_cached_data()
         if not customer_ids:
             # Get all customers from data
-            df = pd.read_csv(DATA_PATH)
-            customer_ids = df['customer_id'].unique().tolist()
+            customer_ids = history.df['customer_id'].unique().tolist()
         
-        if predictor is None:
-            if not init_predictor():
-                return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
+        batch_predictor = get_predictor()
+        if batch_predictor is None:
+            return jsonify({'error': 'Model not loaded. Please train the model first.'}), 500
         
-        # Batch predict
-        results_df = predictor.predict_batch(customer_ids, DATA_PATH)
-        results = results_df.to_dict('records')
+        # Batch predict from the resident prepared history, without preparing it again
+        results_df = batch_predictor.predict_batch(customer_ids, prepared=history.prepared,
+                                                   row_indices=history.row_indices)
+        
+        # Per-customer LLM explanations on request, fetched concurrently
+        if use_llm and len(results_df) > 0:
+            try:
+                if explainer:
+                    explanations = explainer.explain_many(results_df.to_dict('records'))
+                else:
+                    explanations = ["LLM explainer not available"] * len(results_df)
+            except Exception as e:
+                explanations = [f"LLM explanation error: {str(e)}"] * len(results_df)
+            results_df['llm_explanation'] = explanations
+        
+        if len(results_df) > 0:
+            results_df['payment_history'] = results_df['payment_history'].map(format_payment_history)
         
         # Always generate LLM insights (core feature)
         insights = None
@@ -118,12 +349,11 @@ def predict_batch():
         except Exception as e:
             insights = f"LLM insights error: {str(e)}"
         
-        return jsonify({
+        return records_response({
             'success': True,
-            'predictions': results,
-            'count': len(results),
+            'count': len(results_df),
             'insights': insights
-        })
+        }, 'predictions', results_df)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -132,19 +362,8 @@ def predict_batch():
 def get_customers():
     """Get list of all customers"""
     try:
-        df = pd.read_csv(DATA_PATH)
-        customers = df['customer_id'].unique().tolist()
-        
-        # Get basic stats for each customer
-        customer_stats = []
-        for customer_id in customers:
-            customer_df = df[df['customer_id'] == customer_id]
-            customer_stats.append({
-                'customer_id': customer_id,
-                'total_payments': len(customer_df),
-                'last_payment': customer_df['payment_date'].max(),
-                'first_payment': customer_df['payment_date'].min()
-            })
+        # Served from the in-memory history; the file is only re-read when it changes
+        customer_stats = get_customer_stats()
         
         return jsonify({
             'success': True,
@@ -159,20 +378,21 @@ def get_customers():
 def get_customer_history(customer_id):
     """Get payment history for a specific customer"""
     try:
-        df = pd.read_csv(DATA_PATH)
-        customer_df = df[df['customer_id'] == customer_id]
+        customer_df = get_customer_rows(customer_id)
         
-        if len(customer_df) == 0:
+        if customer_df is None:
             return jsonify({'error': 'Customer not found'}), 404
         
-        history = customer_df.to_dict('records')
+        history_df = customer_df.assign(**{
+            column: customer_df[column].dt.strftime('%Y-%m-%d')
+            for column in customer_df.select_dtypes(include='datetime').columns
+        })
         
-        return jsonify({
+        return records_response({
             'success': True,
             'customer_id': customer_id,
-            'history': history,
-            'total_payments': len(history)
-        })
+            'total_payments': len(history_df)
+        }, 'history', history_df)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -184,9 +404,15 @@ def train_model():
         data = request.json
         data_path = data.get('data_path', DATA_PATH)
         
-        global predictor
-        predictor = EMIPaymentPredictor()
-        metrics = predictor.train_model(data_path)
+        # Train a fresh predictor, then swap it in so requests never see a half-trained model
+        trained = EMIPaymentPredictor()
+        metrics = trained.train_model(data_path)
+        
+        global predictor, _predictor_mtime
+        with _predictor_lock:
+            predictor = trained
+            _predictor_mtime = os.stat(trained.model_path).st_mtime_ns
+            _predict_cached.cache_clear()
         
         return jsonify({
             'success': True,
@@ -200,7 +426,7 @@ def train_model():
 if __name__ == '__main__':
     # Try to initialize predictor on startup
     print("Initializing EMI Payment Predictor API...")
-    if os.path.exists(MODEL_PATH):
+    if os.path.exists(find_model_path(MODEL_PATH)):
         init_predictor()
         print("Model loaded successfully!")
     else:
@@ -1,20 +1,21 @@
 """
 Script to run the backend server
 """
-from waitress import serve
-from app import app
+import importlib.util
 import os
+import subprocess
 import sys
 
 # Add parent directory to path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from predictor import EMIPaymentPredictor
+from predictor import EMIPaymentPredictor, find_model_path
 from config import MODEL_PATH
 
 # Fix MODEL_PATH to be relative to project root
 MODEL_PATH_FIXED = os.path.join(parent_dir, MODEL_PATH) if not os.path.isabs(MODEL_PATH) else MODEL_PATH
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 
 def main():
     print("=" * 60)
@@ -22,7 +23,7 @@ def main():
     print("=" * 60)
     
     # Try to load model
-    if os.path.exists(MODEL_PATH_FIXED):
+    if os.path.exists(find_model_path(MODEL_PATH_FIXED)):
         try:
             predictor = EMIPaymentPredictor()
             predictor.load_model(MODEL_PATH_FIXED)
@@ -38,6 +39,7 @@ def main():
     print("API endpoints:")
     print("  GET  /api/health - Health check")
     print("  POST /api/predict - Predict single customer")
+    print("  GET  /api/predict/<id> - Predict single customer (no LLM)")
     print("  POST /api/predict/batch - Batch predictions")
     print("  GET  /api/customers - List all customers")
     print("  GET  /api/customer/<id>/history - Customer history")
@@ -45,8 +47,25 @@ def main():
     print("\nPress Ctrl+C to stop the server")
     print("=" * 60)
     
-    # Run with waitress for production
-    serve(app, host='0.0.0.0', port=5000, threads=4)
+    if os.name != 'nt' and importlib.util.find_spec('gunicorn') is not None:
+        # Worker processes run CPU-bound predictions in parallel (threads would share the GIL).
+        # --preload builds the app once in the master, so the model and data are shared by fork.
+        # The working directory is left alone; backend/ is only added to the import path.
+        workers = 2 * (os.cpu_count() or 1)
+        print(f"Serving with gunicorn ({workers} workers)")
+        subprocess.run([
+            sys.executable, '-m', 'gunicorn',
+            '-w', str(workers),
+            '-b', '0.0.0.0:5000',
+            '--preload',
+            '--pythonpath', BACKEND_DIR,
+            'app:create_app()'
+        ])
+    else:
+        # Run with waitress (gunicorn not installed or not supported on this platform)
+        from waitress import serve
+        from app import app
+        serve(app, host='0.0.0.0', port=5000, threads=4)
 
 if __name__ == '__main__':
     main()
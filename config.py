@@ -9,6 +9,9 @@ load_dotenv()
 # OpenAI API Configuration (Required - LLM is a core feature)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")  # Default to GPT-4 Turbo
+LLM_MAX_CONCURRENT_REQUESTS = 16  # Parallel LLM calls when explaining a batch
+LLM_CACHE_SIZE = 4096  # LLM responses kept in memory
+LLM_CACHE_DIR = ".llm_cache"  # On-disk LLM response cache (used when diskcache is installed)
 
 if not OPENAI_API_KEY:
     print("Warning: OPENAI_API_KEY not found. LLM features require an API key.")
@@ -18,12 +21,17 @@ else:
     print(f"OpenAI API key loaded. Using model: {OPENAI_MODEL}")
 
 # Model Configuration
-MODEL_PATH = "models/emi_predictor_model.pkl"
-DATA_PATH = "data/emi_history.csv"
+MODEL_PATH = "models/emi_predictor_model.json"  # XGBoost native format
+DATA_PATH = os.getenv("EMI_DATA_PATH", "data/emi_history.csv")
 
 # Prediction Settings
 MIN_HISTORY_RECORDS = 3  # Minimum records needed for prediction
 DEFAULT_PREDICTION_DAYS = 30  # Default prediction window
+PREDICTION_CACHE_SIZE = 2048  # Single-customer predictions memoised by the predictor and API
+
+# Batch Prediction Settings
+BATCH_WORKERS = int(os.getenv("EMI_BATCH_WORKERS", "1"))  # Worker processes (-1 = all cores)
+BATCH_CHUNK_SIZE = 50_000  # Predictions per chunk when streaming batch results to disk
 
 # Feature Engineering Settings
 FEATURE_WINDOWS = [7, 14, 30, 60, 90]  # Days for rolling features
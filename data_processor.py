@@ -1,10 +1,29 @@
 """
 Data processing and feature engineering module for EMI payment prediction
 """
+import glob
+import os
+import shutil
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+    from pyarrow import dataset as ds
+    from pyarrow import parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DATE_COLUMNS = ['payment_date', 'scheduled_date']
+# Rows per row group of the per-customer cache (see _ensure_parquet_cache)
+CUSTOMER_CACHE_ROW_GROUP_SIZE = 4096
+# Layout of the cached prepare_data output (see load_data); bump whenever prepare_data
+# changes the columns or dtypes it returns, so caches written by older code are not read
+PREPARED_CACHE_FORMAT = 2
 
 
 class EMIDataProcessor:
@@ -13,28 +32,241 @@ class EMIDataProcessor:
     def __init__(self):
         self.feature_windows = [7, 14, 30, 60, 90]
     
-    def load_data(self, file_path: str) -> pd.DataFrame:
-        """Load EMI payment history data"""
-        df = pd.read_csv(file_path)
-        df['payment_date'] = pd.to_datetime(df['payment_date'])
-        df = df.sort_values('payment_date')
+    def read_history(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read raw payment history from CSV or Parquet, optionally only the given columns"""
+        if file_path.endswith('.parquet'):
+            # Columnar read: unused columns are skipped and dates keep their native dtype
+            df = pd.read_parquet(file_path, columns=columns)
+            if 'customer_id' in df.columns:
+                df['customer_id'] = df['customer_id'].astype('category')
+            return df
+        
+        if PYARROW_AVAILABLE:
+            try:
+                return self._read_csv_arrow(file_path, columns)
+            except pa.ArrowInvalid:
+                # Dates or values pyarrow cannot parse: fall back to pandas' more lenient reader
+                pass
+        
+        # Parse dates and categorise ids while tokenizing rather than in a second pass
+        present = columns if columns is not None else pd.read_csv(file_path, nrows=0).columns
+        return pd.read_csv(
+            file_path,
+            usecols=columns,
+            parse_dates=[column for column in DATE_COLUMNS if column in present],
+            cache_dates=True,
+            dtype={'customer_id': 'category'} if 'customer_id' in present else None
+        )
+    
+    def _read_csv_arrow(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a history CSV with pyarrow's multithreaded parser (dates typed, ids categorical)"""
+        column_types = {column: pa.timestamp('s') for column in DATE_COLUMNS}
+        column_types['customer_id'] = pa.dictionary(pa.int32(), pa.string())
+        table = pacsv.read_csv(file_path, convert_options=pacsv.ConvertOptions(
+            include_columns=columns, column_types=column_types))
+        return table.to_pandas()
+    
+    def read_customer_history(self, file_path: str, customer_id: str) -> pd.DataFrame:
+        """Read only one customer's raw payment rows
+        
+        Parquet files are filtered while reading. CSV files are converted once to a
+        Parquet file sorted by customer (see _ensure_parquet_cache), so only the
+        row groups holding that customer are read.
+        """
+        if file_path.endswith('.parquet'):
+            return pd.read_parquet(file_path, filters=[('customer_id', '==', customer_id)])
+        
+        if PYARROW_AVAILABLE:
+            try:
+                cache_path = self._ensure_parquet_cache(file_path)
+            except Exception as e:
+                # The cache only saves work: read the file itself instead
+                print(f"Warning: Could not cache customer data for {file_path}: {e}")
+            else:
+                return ds.dataset(cache_path, format='parquet').to_table(
+                    filter=ds.field('customer_id') == customer_id).to_pandas()
+        
+        df = self.read_history(file_path)
+        return df[df['customer_id'] == customer_id]
+    
+    def _file_version(self, file_path: str) -> str:
+        """Key of the current version of a data file (modification time and size) for caches built from it"""
+        stat = os.stat(file_path)
+        return f"{stat.st_mtime_ns}_{stat.st_size}"
+    
+    def _ensure_parquet_cache(self, file_path: str) -> str:
+        """Write ``<file_path>.parquet/<version>.parquet``, the history sorted by customer_id, if missing
+        
+        Row groups are kept small, so their min/max statistics let a filter on one
+        customer skip all but a few of them. Every version of the file (see
+        _file_version) gets its own cache file, so a rebuild never touches the one
+        other readers are using.
+        """
+        cache_root = file_path + '.parquet'
+        cache_path = os.path.join(cache_root, self._file_version(file_path) + '.parquet')
+        if os.path.exists(cache_path):
+            return cache_path
+        
+        table = pa.Table.from_pandas(self.read_history(file_path), preserve_index=False)
+        column = table.schema.get_field_index('customer_id')
+        # Plain strings, so numeric-looking ids still match string filters
+        table = table.set_column(column, 'customer_id', table.column(column).cast(pa.string()))
+        # Stable sort: each customer's rows keep their order in the file
+        table = table.sort_by('customer_id')
+        
+        os.makedirs(cache_root, exist_ok=True)
+        # Write beside the cache and swap it in, so readers never see a half-written file
+        tmp_path = f"{cache_path}.tmp{os.getpid()}"
+        try:
+            pq.write_table(table, tmp_path, row_group_size=CUSTOMER_CACHE_ROW_GROUP_SIZE)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        # Caches of earlier versions of the file are never read again
+        for entry in os.listdir(cache_root):
+            path = os.path.join(cache_root, entry)
+            if path != cache_path and '.tmp' not in entry:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass  # Already pruned by another process
+        return cache_path
+    
+    def write_results(self, df: pd.DataFrame, output_path: str):
+        """Write prediction results to CSV, or to Parquet when the path ends in .parquet"""
+        if output_path.endswith('.parquet'):
+            df.to_parquet(output_path, engine='pyarrow', index=False)
+        else:
+            df.to_csv(output_path, index=False)
+    
+    def write_results_stream(self, chunks: Iterable[pd.DataFrame], output_path: str) -> int:
+        """Write chunks of prediction results as they arrive (format as for write_results)
+        
+        Only one chunk is held in memory at a time. Returns the number of rows written.
+        """
+        rows = 0
+        writer = None
+        try:
+            for chunk in chunks:
+                if len(chunk) == 0:
+                    continue
+                if output_path.endswith('.parquet'):
+                    if writer is None:
+                        schema = pa.Table.from_pandas(chunk, preserve_index=False).schema
+                        # Columns with no values yet (all None) hold date strings in later chunks
+                        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                            for field in schema], metadata=schema.metadata)
+                        writer = pq.ParquetWriter(output_path, schema)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+                else:
+                    chunk.to_csv(output_path, mode='a' if rows else 'w', header=not rows, index=False)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if rows == 0:
+            self.write_results(pd.DataFrame(), output_path)
+        return rows
+    
+    def read_results(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read prediction results written by write_results / write_results_stream"""
+        if file_path.endswith('.parquet'):
+            return pd.read_parquet(file_path, columns=columns)
+        return pd.read_csv(file_path, usecols=columns)
+    
+    def load_data(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Load EMI payment history data
+        
+        A full load (all columns) is cached beside the file as Parquet, keyed by the
+        file's modification time and size and by PREPARED_CACHE_FORMAT, so dates are
+        parsed and delays computed once per version of the file rather than on every load.
+        """
+        if columns is not None or not PYARROW_AVAILABLE:
+            return self.prepare_data(self.read_history(file_path, columns))
+        
+        cache_path = self._prepared_cache_path(file_path)
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
+        
+        df = self.prepare_data(self.read_history(file_path))
+        # Write beside the cache and swap it in, so readers never see a half-written file
+        tmp_path = f"{cache_path}.tmp{os.getpid()}"
+        try:
+            df.to_parquet(tmp_path, engine='pyarrow')
+            os.replace(tmp_path, cache_path)
+            # Caches of earlier versions of the file are never read again
+            for stale_path in glob.glob(f"{glob.escape(file_path)}.prepared_*.parquet"):
+                if stale_path != cache_path:
+                    os.remove(stale_path)
+        except Exception as e:
+            # The cache only saves work: the load itself has succeeded
+            print(f"Warning: Could not cache prepared data for {file_path}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
         return df
     
+    def _prepared_cache_path(self, file_path: str) -> str:
+        """Path of the cached prepare_data output for the current version of ``file_path``"""
+        return f"{file_path}.prepared_v{PREPARED_CACHE_FORMAT}_{self._file_version(file_path)}.parquet"
+    
+    def load_customer_data(self, file_path: str, customer_id: str) -> pd.DataFrame:
+        """Load and prepare one customer's payment history"""
+        return self.prepare_data(self.read_customer_history(file_path, customer_id))
+    
+    def prepare_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Parse dates, sort and add derived columns to a loaded payment history (returns a new frame)
+        
+        Adds delay_days, day_of_week and month, computed once over all rows. Numeric
+        columns are narrowed (int16 / float32) to cut the bytes every reduction reads.
+        """
+        # Date columns are datetime64[ns] from here on, whatever unit the reader produced, so
+        # downstream code needs no type checks and cached copies (see load_data) match fresh loads
+        dates = {column: pd.to_datetime(df[column]).astype('datetime64[ns]') for column in DATE_COLUMNS
+                 if column in df.columns and df[column].dtype != 'datetime64[ns]'}
+        if dates:
+            df = df.assign(**dates)
+        df = df.sort_values('payment_date')
+        # Categorical ids: equality filters and groupby work on integer codes, not Python strings
+        if not isinstance(df['customer_id'].dtype, pd.CategoricalDtype):
+            df['customer_id'] = df['customer_id'].astype('category')
+        df = self.calculate_payment_delays(df)
+        df['day_of_week'] = df['payment_date'].dt.dayofweek.astype('int8')
+        df['month'] = df['payment_date'].dt.month.astype('int8')
+        
+        # Delays only fit an integer dtype when no scheduled/payment date is missing
+        narrow_dtypes = {'delay_days': 'int16' if df['delay_days'].notna().all() else 'float32'}
+        if 'amount' in df.columns:
+            narrow_dtypes['amount'] = 'float32'
+        return df.astype(narrow_dtypes)
+    
     def calculate_payment_delays(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate days between scheduled and actual payment dates"""
         if 'scheduled_date' in df.columns:
-            # Ensure scheduled_date is datetime
-            df['scheduled_date'] = pd.to_datetime(df['scheduled_date'])
+            # Ensure scheduled_date is datetime (already parsed when read by read_history)
+            if not pd.api.types.is_datetime64_any_dtype(df['scheduled_date']):
+                df['scheduled_date'] = pd.to_datetime(df['scheduled_date'])
             df['delay_days'] = (df['payment_date'] - df['scheduled_date']).dt.days
         else:
-            # If no scheduled date, calculate days between payments
-            df['delay_days'] = df['payment_date'].diff().dt.days
-            df['delay_days'].fillna(0, inplace=True)
+            # If no scheduled date, calculate days between each customer's own payments
+            # (so one customer's rows give the same delays alone as within the full history)
+            payment_dates = df.groupby('customer_id', sort=False, observed=True)['payment_date']
+            df['delay_days'] = payment_dates.diff().dt.days.fillna(0)
         return df
     
-    def engineer_features(self, df: pd.DataFrame, customer_id: str) -> pd.DataFrame:
-        """Engineer features for a specific customer"""
-        customer_df = df[df['customer_id'] == customer_id].copy()
+    def engineer_features(self, df: pd.DataFrame, customer_id: Optional[str] = None) -> Optional[Dict]:
+        """Engineer features for a specific customer, as a dict of feature name -> scalar
+        
+        With ``customer_id=None``, ``df`` is taken to hold only that customer's rows
+        (e.g. one group of a groupby) and is used without filtering.
+        """
+        customer_df = df if customer_id is None else df[df['customer_id'] == customer_id]
         
         if len(customer_df) < 2:
             return None
@@ -59,79 +291,115 @@ class EMIDataProcessor:
             features['avg_interval'] = payment_intervals.mean()
             features['interval_std'] = payment_intervals.std()
         
-        # Day of week patterns
-        customer_df['day_of_week'] = customer_df['payment_date'].dt.dayofweek
-        features['preferred_day'] = customer_df['day_of_week'].mode()[0] if len(customer_df['day_of_week'].mode()) > 0 else 0
-        
-        # Month patterns
-        customer_df['month'] = customer_df['payment_date'].dt.month
-        features['preferred_month'] = customer_df['month'].mode()[0] if len(customer_df['month'].mode()) > 0 else 0
+        # Day of week / month patterns: most frequent value, smallest on ties like mode()[0]
+        days = customer_df['day_of_week'].to_numpy()
+        features['preferred_day'] = int(np.bincount(days, minlength=7).argmax()) if days.size else 0
+        months = customer_df['month'].to_numpy()
+        features['preferred_month'] = int(np.bincount(months, minlength=13).argmax()) if months.size else 0
         
-        # Rolling statistics
-        for window in self.feature_windows:
-            window_df = customer_df[customer_df['payment_date'] >= 
-                                   customer_df['payment_date'].max() - timedelta(days=window)]
-            if len(window_df) > 0:
-                features[f'delay_mean_{window}d'] = window_df['delay_days'].mean()
-                features[f'payment_count_{window}d'] = len(window_df)
+        # Rolling statistics: history is sorted by payment date, so one searchsorted
+        # finds where every window starts
+        dates = customer_df['payment_date'].to_numpy()
+        delays = customer_df['delay_days'].to_numpy(dtype=float)
+        cutoffs = dates.max() - np.array(self.feature_windows, dtype='timedelta64[D]')
+        window_starts = np.searchsorted(dates, cutoffs, side='left')
+        for window, start in zip(self.feature_windows, window_starts):
+            window_delays = delays[start:]
+            if len(window_delays) > 0:
+                features[f'delay_mean_{window}d'] = np.nanmean(window_delays)
+                features[f'payment_count_{window}d'] = len(window_delays)
             else:
                 features[f'delay_mean_{window}d'] = 0
                 features[f'payment_count_{window}d'] = 0
         
         # Last payment information
-        last_payment = customer_df.iloc[-1]
-        features['last_payment_date'] = last_payment['payment_date']
-        features['last_delay'] = last_payment['delay_days']
-        features['days_since_last_payment'] = (datetime.now() - last_payment['payment_date']).days
+        last_payment_date = customer_df['payment_date'].iat[-1]
+        features['last_payment_date'] = last_payment_date
+        features['last_delay'] = customer_df['delay_days'].iat[-1]
+        features['days_since_last_payment'] = (datetime.now() - last_payment_date).days
         
         # Payment amount statistics (if available)
         if 'amount' in customer_df.columns:
             features['avg_amount'] = customer_df['amount'].mean()
-            features['last_amount'] = last_payment['amount']
+            features['last_amount'] = customer_df['amount'].iat[-1]
         
-        return pd.DataFrame([features])
+        return features
+    
+    def _expanding_mode(self, values: np.ndarray, groups: pd.Series, minlength: int) -> np.ndarray:
+        """Most frequent value (smallest on ties, like Series.mode()[0]) of every prefix within each group"""
+        one_hot = np.zeros((len(values), minlength), dtype=np.int32)
+        one_hot[np.arange(len(values)), values] = 1
+        group_codes = pd.factorize(groups)[0]
+        counts = pd.DataFrame(one_hot).groupby(group_codes, sort=False).cumsum().to_numpy()
+        return counts.argmax(axis=1)
     
     def prepare_training_data(self, df: pd.DataFrame) -> tuple:
-        """Prepare training data with features and targets"""
-        X_list = []
-        y_list = []
-        
-        for customer_id in df['customer_id'].unique():
-            customer_df = df[df['customer_id'] == customer_id].copy()
-            
-            if len(customer_df) < 3:
-                continue
-            
-            # For each payment (except the last one), use previous payments to predict next payment date
-            for i in range(2, len(customer_df)):
-                historical = customer_df.iloc[:i]
-                target = customer_df.iloc[i]
-                
-                features = self.engineer_features(
-                    df[df['customer_id'] == customer_id].iloc[:i], 
-                    customer_id
-                )
-                
-                if features is not None:
-                    # Target: days until next payment
-                    if i < len(customer_df) - 1:
-                        next_payment = customer_df.iloc[i+1]
-                        days_until_next = (next_payment['payment_date'] - target['payment_date']).days
-                    else:
-                        days_until_next = (target['payment_date'] - historical.iloc[-1]['payment_date']).days
-                    
-                    X_list.append(features)
-                    y_list.append(days_until_next)
-        
-        if len(X_list) == 0:
-            return None, None
+        """Prepare training data with features and targets
+        
+        Each payment prefix of each customer is one sample, with the same features
+        engineer_features() would produce for that prefix. They are computed with
+        grouped cumulative/expanding/rolling operations over the whole frame
+        rather than by calling engineer_features() once per prefix.
+        """
+        # Keep each customer's rows contiguous (customers in order of first appearance,
+        # rows in date order) so grouped window results line up with df positionally
+        order = pd.factorize(df['customer_id'])[0]
+        df = df.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+        
+        grouped = df.groupby('customer_id', sort=False, observed=True)
+        position = grouped.cumcount()
+        size = grouped['payment_date'].transform('size')
+        delays = grouped['delay_days']
+        intervals = grouped['payment_date'].diff().dt.days
+        interval_groups = intervals.groupby(df['customer_id'], sort=False, observed=True)
+        
+        X = pd.DataFrame(index=df.index)
+        
+        # Basic statistics
+        X['total_payments'] = position + 1
+        X['avg_delay'] = delays.expanding().mean().to_numpy()
+        X['std_delay'] = delays.expanding().std().to_numpy()
+        X['max_delay'] = delays.cummax()
+        X['min_delay'] = delays.cummin()
+        
+        # Recent payment trends (last 3 payments)
+        X['recent_avg_delay'] = delays.rolling(3, min_periods=1).mean().to_numpy()
+        delay_changes = delays.diff().groupby(df['customer_id'], sort=False, observed=True)
+        X['recent_trend'] = delay_changes.rolling(2, min_periods=1).mean().to_numpy()
+        
+        # Payment frequency
+        X['avg_interval'] = interval_groups.expanding().mean().to_numpy()
+        X['interval_std'] = interval_groups.expanding().std().to_numpy()
+        
+        # Day of week / month patterns
+        X['preferred_day'] = self._expanding_mode(df['day_of_week'].to_numpy(), df['customer_id'], 7)
+        X['preferred_month'] = self._expanding_mode(df['month'].to_numpy(), df['customer_id'], 13)
+        
+        # Rolling statistics: payments within `window` days of the latest one, inclusive
+        for window in self.feature_windows:
+            window_delays = grouped.rolling(f'{window}D', on='payment_date', closed='both')['delay_days']
+            X[f'delay_mean_{window}d'] = window_delays.mean().to_numpy()
+            X[f'payment_count_{window}d'] = window_delays.count().to_numpy()
         
-        X = pd.concat(X_list, ignore_index=True)
-        y = np.array(y_list)
+        # Last payment information
+        X['last_delay'] = df['delay_days']
+        X['days_since_last_payment'] = (datetime.now() - df['payment_date']).dt.days
+        
+        # Payment amount statistics (if available)
+        if 'amount' in df.columns:
+            X['avg_amount'] = grouped['amount'].expanding().mean().to_numpy()
+            X['last_amount'] = df['amount']
         
-        # Drop non-numeric columns for model training
-        X_numeric = X.select_dtypes(include=[np.number]).copy()
-        X_numeric = X_numeric.drop(columns=['last_payment_date'], errors='ignore')
+        # Target: days until next payment. The sample ending at row j uses the
+        # interval after row j + 1, or the one after row j for the final sample.
+        y = interval_groups.shift(-2).fillna(interval_groups.shift(-1))
+        
+        # Samples are prefixes of at least 2 payments that still have a target
+        mask = (position >= 1) & (position <= size - 2)
+        if not mask.any():
+            return None, None
+        
+        X_numeric = X[mask].reset_index(drop=True).astype('float32')
+        y = y[mask].astype(int).to_numpy()
         
         return X_numeric, y
-
@@ -4,6 +4,7 @@ Generate predictions for all customers and save to CSV
 import pandas as pd
 from datetime import datetime
 from predictor import EMIPaymentPredictor
+from data_processor import EMIDataProcessor
 from config import DATA_PATH, MODEL_PATH
 import os
 
@@ -16,7 +17,7 @@ def generate_predictions_csv():
     
     # Load data to get all customers
     print("\nLoading customer data...")
-    df = pd.read_csv(DATA_PATH)
+    df = EMIDataProcessor().read_history(DATA_PATH)
     customer_ids = df['customer_id'].unique().tolist()
     print(f"Found {len(customer_ids)} customers")
     
@@ -26,34 +27,26 @@ def generate_predictions_csv():
     predictor.load_model()
     print("Model loaded successfully!")
     
-    # Generate predictions for all customers
+    # Generate predictions for all customers (in parallel when BATCH_WORKERS > 1)
     print("\nGenerating predictions...")
+    predictions_df = predictor.predict_batch(customer_ids, df=df)
+    
     results = []
+    for result in predictions_df.to_dict('records'):
+        # Extract the data with proper column names
+        prediction_data = {
+            'Customer ID': result['customer_id'],
+            'Last Demand Date': result.get('last_demand_date', '') if result.get('last_demand_date') else '',
+            'Last Payment': result['last_payment_date'],
+            'Next Demand Date': result.get('next_demand_date', '') if result.get('next_demand_date') else '',
+            'Predicted Date': result['predicted_payment_date'],
+            'Avg Delay': round(result['average_delay'], 2),
+            'Confidence': f"{result['confidence_score']*100:.1f}%"
+        }
+        
+        results.append(prediction_data)
     
-    for i, customer_id in enumerate(customer_ids, 1):
-        try:
-            result = predictor.predict_next_payment_date(customer_id, DATA_PATH)
-            
-            # Extract the data with proper column names
-            prediction_data = {
-                'Customer ID': result['customer_id'],
-                'Last Demand Date': result.get('last_demand_date', '') if result.get('last_demand_date') else '',
-                'Last Payment': result['last_payment_date'],
-                'Next Demand Date': result.get('next_demand_date', '') if result.get('next_demand_date') else '',
-                'Predicted Date': result['predicted_payment_date'],
-                'Avg Delay': round(result['average_delay'], 2),
-                'Confidence': f"{result['confidence_score']*100:.1f}%"
-            }
-            
-            results.append(prediction_data)
-            
-            if i % 10 == 0:
-                print(f"  Processed {i}/{len(customer_ids)} customers...")
-                
-        except Exception as e:
-            print(f"  Warning: Could not predict for {customer_id}: {str(e)}")
-            # Skip customers that can't be predicted
-            continue
+    print(f"  Processed {len(customer_ids)} customers, {len(results)} predicted")
     
     # Create DataFrame
     results_df = pd.DataFrame(results)
@@ -4,7 +4,6 @@ Generate sample EMI payment history data for testing
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
 
 
 def generate_sample_data(num_customers: int = 50, payments_per_customer: int = 12, 
@@ -13,50 +12,41 @@ def generate_sample_data(num_customers: int = 50, payments_per_customer: int = 1
     
     print(f"Generating sample data for {num_customers} customers...")
     
-    data = []
-    
-    for customer_id in range(1, num_customers + 1):
-        # Base payment date (start from 6 months ago)
-        base_date = datetime.now() - timedelta(days=180)
-        
-        # Customer-specific payment behavior
-        base_interval = random.choice([28, 30, 31, 32])  # Monthly payment cycle
-        delay_tendency = random.choice(['on_time', 'early', 'late'])
-        
-        if delay_tendency == 'on_time':
-            delay_range = (-2, 2)
-        elif delay_tendency == 'early':
-            delay_range = (-5, 0)
-        else:  # late
-            delay_range = (0, 10)
-        
-        current_date = base_date
-        
-        for payment_num in range(payments_per_customer):
-            # Add some randomness to payment interval
-            interval = base_interval + random.randint(-3, 3)
-            current_date = current_date + timedelta(days=interval)
-            
-            # Calculate delay
-            delay = random.randint(*delay_range)
-            actual_payment_date = current_date + timedelta(days=delay)
-            
-            # Skip if payment date is in the future
-            if actual_payment_date > datetime.now():
-                break
-            
-            # Generate payment amount (EMI amount)
-            amount = random.uniform(5000, 50000)
-            
-            data.append({
-                'customer_id': f'CUST_{customer_id:04d}',
-                'payment_date': actual_payment_date.strftime('%Y-%m-%d'),
-                'scheduled_date': current_date.strftime('%Y-%m-%d'),
-                'amount': round(amount, 2),
-                'payment_status': 'completed'
-            })
-    
-    df = pd.DataFrame(data)
+    rng = np.random.default_rng()
+    n, m = num_customers, payments_per_customer
+    now = datetime.now()
+    
+    # Base payment date (start from 6 months ago)
+    base_date = now - timedelta(days=180)
+    
+    # Customer-specific payment behavior: monthly cycle and delay tendency
+    # (on_time: -2..2, early: -5..0, late: 0..10 days)
+    base_interval = rng.choice([28, 30, 31, 32], size=(n, 1))
+    delay_tendency = rng.integers(0, 3, size=(n, 1))
+    delay_low = np.array([-2, -5, 0])[delay_tendency]
+    delay_high = np.array([2, 0, 10])[delay_tendency]
+    
+    # All payments at once: randomized intervals accumulate into scheduled dates
+    intervals = base_interval + rng.integers(-3, 4, size=(n, m))
+    delays = rng.integers(delay_low, delay_high + 1, size=(n, m))
+    scheduled_offsets = intervals.cumsum(axis=1)
+    scheduled_dates = pd.Timestamp(base_date) + pd.to_timedelta(scheduled_offsets.ravel(), unit='D')
+    payment_dates = scheduled_dates + pd.to_timedelta(delays.ravel(), unit='D')
+    
+    # Stop each customer's history at its first payment date in the future
+    in_past = np.asarray(payment_dates <= now).reshape(n, m)
+    keep = np.cumprod(in_past, axis=1).astype(bool).ravel()
+    
+    # Generate payment amount (EMI amount)
+    amounts = rng.uniform(5000, 50000, size=n * m).round(2)
+    
+    df = pd.DataFrame({
+        'customer_id': np.repeat([f'CUST_{i:04d}' for i in range(1, n + 1)], m),
+        'payment_date': payment_dates.strftime('%Y-%m-%d'),
+        'scheduled_date': scheduled_dates.strftime('%Y-%m-%d'),
+        'amount': amounts,
+        'payment_status': 'completed'
+    })[keep].reset_index(drop=True)
     
     # Create data directory if it doesn't exist
     import os
@@ -67,6 +57,17 @@ def generate_sample_data(num_customers: int = 50, payments_per_customer: int = 1
     
     print(f"Sample data generated: {len(df)} payment records")
     print(f"Saved to: {output_file}")
+    
+    # Also save a Parquet copy (native date types, columnar reads)
+    parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+    try:
+        df.assign(
+            payment_date=pd.to_datetime(df['payment_date']),
+            scheduled_date=pd.to_datetime(df['scheduled_date'])
+        ).to_parquet(parquet_file, engine='pyarrow', compression='snappy', index=False)
+        print(f"Saved to: {parquet_file}")
+    except ImportError:
+        print("pyarrow not installed, skipping Parquet output (pip install pyarrow)")
     print(f"\nData preview:")
     print(df.head(10))
     print(f"\nData statistics:")
@@ -3,20 +3,38 @@ LLM integration for explaining predictions and generating insights
 Core feature of the EMI Payment Predictor system
 """
 import os
-from typing import Dict, Optional
-from config import OPENAI_API_KEY, OPENAI_MODEL
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+from config import (OPENAI_API_KEY, OPENAI_MODEL, LLM_MAX_CONCURRENT_REQUESTS,
+                    LLM_CACHE_SIZE, LLM_CACHE_DIR)
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
     raise ImportError("OpenAI library is required. Install it with: pip install openai")
 
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
 
 class LLMExplainer:
     """LLM-powered explanation engine - Core feature for intelligent predictions"""
     
+    EXPLANATION_UNAVAILABLE = (
+        "⚠️ LLM Explanation Unavailable: OpenAI API key is required for AI-powered explanations.\n"
+        "Please set OPENAI_API_KEY in your .env file.\n"
+        "Get your API key from: https://platform.openai.com/api-keys"
+    )
+    
     def __init__(self):
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI library is required. Install with: pip install openai")
@@ -29,17 +47,139 @@ class LLMExplainer:
         else:
             self.client = OpenAI(api_key=OPENAI_API_KEY)
             print("LLM Explainer initialized successfully with OpenAI API")
+        
+        # Response cache: in-memory LRU, backed by an on-disk cache when diskcache is installed
+        self._memory_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.disk_cache = None
+        if DISKCACHE_AVAILABLE:
+            cache_dir = LLM_CACHE_DIR
+            if not os.path.isabs(cache_dir):
+                cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), cache_dir)
+            self.disk_cache = diskcache.Cache(cache_dir)
+    
+    def _cache_key(self, request: Dict) -> str:
+        """Hash of everything that determines a completion (model, messages, sampling settings)"""
+        payload = json.dumps(request, sort_keys=True).encode()
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
     
-    def explain_prediction(self, prediction_result: Dict, customer_history: list) -> str:
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Cached completion for a request key, or None"""
+        with self._cache_lock:
+            if key in self._memory_cache:
+                self._memory_cache.move_to_end(key)
+                return self._memory_cache[key]
+        if self.disk_cache is not None:
+            content = self.disk_cache.get(key)
+            if content is not None:
+                self._cache_set(key, content, disk=False)
+            return content
+        return None
+    
+    def _cache_set(self, key: str, content: str, disk: bool = True):
+        """Store a completion, evicting the least recently used entries past LLM_CACHE_SIZE"""
+        with self._cache_lock:
+            self._memory_cache[key] = content
+            self._memory_cache.move_to_end(key)
+            while len(self._memory_cache) > LLM_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+        if disk and self.disk_cache is not None:
+            self.disk_cache.set(key, content)
+    
+    def _complete(self, request: Dict, no_cache: bool = False) -> str:
+        """Run a chat completion, answering repeated requests from the cache unless no_cache"""
+        key = self._cache_key(request)
+        if not no_cache:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+        response = self.client.chat.completions.create(**request)
+        content = response.choices[0].message.content.strip()
+        self._cache_set(key, content)
+        return content
+    
+    def explain_prediction(self, prediction_result: Dict, customer_history: list,
+                           no_cache: bool = False) -> str:
         """Generate AI-powered human-readable explanation of the prediction using LLM"""
         
         if not self.client:
-            return (
-                "⚠️ LLM Explanation Unavailable: OpenAI API key is required for AI-powered explanations.\n"
-                "Please set OPENAI_API_KEY in your .env file.\n"
-                "Get your API key from: https://platform.openai.com/api-keys"
-            )
+            return self.EXPLANATION_UNAVAILABLE
+        
+        try:
+            return self._complete(self._explanation_request(prediction_result), no_cache)
+        except Exception as e:
+            print(f"LLM API error: {e}")
+            return f"⚠️ LLM Explanation Error: {str(e)}\nPlease check your OpenAI API key and connection."
+    
+    def explain_prediction_stream(self, prediction_result: Dict, no_cache: bool = False) -> Iterator[str]:
+        """Yield the explanation of a prediction piece by piece as the LLM generates it"""
+        if not self.client:
+            yield self.EXPLANATION_UNAVAILABLE
+            return
+        
+        request = self._explanation_request(prediction_result)
+        key = self._cache_key(request)
+        cached = None if no_cache else self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
         
+        try:
+            parts = []
+            for chunk in self.client.chat.completions.create(**request, stream=True):
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    parts.append(content)
+                    yield content
+            self._cache_set(key, ''.join(parts).strip())
+        except Exception as e:
+            print(f"LLM API error: {e}")
+            yield f"⚠️ LLM Explanation Error: {str(e)}\nPlease check your OpenAI API key and connection."
+    
+    def explain_many(self, prediction_results: List[Dict], no_cache: bool = False) -> List[str]:
+        """Explain several predictions with concurrent LLM requests (one explanation per result)"""
+        if not self.client:
+            return [self.EXPLANATION_UNAVAILABLE] * len(prediction_results)
+        
+        requests = [self._explanation_request(result) for result in prediction_results]
+        keys = [self._cache_key(request) for request in requests]
+        explanations = [None if no_cache else self._cache_get(key) for key in keys]
+        
+        # Identical requests (e.g. a repeated customer) are sent once and share the answer
+        missing = {}
+        for i, explanation in enumerate(explanations):
+            if explanation is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            fetched = asyncio.run(self._explain_many_async([requests[indices[0]] for indices in missing.values()]))
+            for indices, explanation in zip(missing.values(), fetched):
+                for i in indices:
+                    explanations[i] = explanation
+        return explanations
+    
+    async def _explain_many_async(self, requests: List[Dict]) -> List[str]:
+        """Run the explanation requests concurrently, preserving order"""
+        # Bound the number of in-flight requests to stay within API rate limits
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENT_REQUESTS)
+        
+        async with AsyncOpenAI(api_key=OPENAI_API_KEY) as aclient:
+            async def explain(request: Dict) -> str:
+                async with semaphore:
+                    try:
+                        response = await aclient.chat.completions.create(**request)
+                        content = response.choices[0].message.content.strip()
+                        self._cache_set(self._cache_key(request), content)
+                        return content
+                    except Exception as e:
+                        print(f"LLM API error: {e}")
+                        return f"⚠️ LLM Explanation Error: {str(e)}\nPlease check your OpenAI API key and connection."
+            
+            return await asyncio.gather(*(explain(request) for request in requests))
+    
+    def _explanation_request(self, prediction_result: Dict) -> Dict:
+        """Build the chat completion arguments for explaining one prediction"""
         prompt = f"""
 You are a financial analyst. Provide a SHORT explanation (2-3 sentences max) for this EMI payment prediction:
 
@@ -53,20 +193,15 @@ Include: (1) Why this date, (2) Risk level (low/medium/high), (3) One key recomm
 Keep it brief and actionable.
 """
         
-        try:
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a concise financial analyst. Always provide brief, actionable explanations."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=150,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"LLM API error: {e}")
-            return f"⚠️ LLM Explanation Error: {str(e)}\nPlease check your OpenAI API key and connection."
+        return dict(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a concise financial analyst. Always provide brief, actionable explanations."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=150,
+            temperature=0.7
+        )
     
     def _generate_simple_explanation(self, prediction_result: Dict, customer_history: list) -> str:
         """Generate explanation without LLM"""
@@ -97,7 +232,7 @@ The prediction is based on:
             formatted.append(f"- Date: {date}, Delay: {delay} days")
         return "\n".join(formatted)
     
-    def generate_insights(self, predictions_df) -> str:
+    def generate_insights(self, predictions_df, no_cache: bool = False) -> str:
         """Generate AI-powered business insights from batch predictions using LLM"""
         if not self.client:
             return (
@@ -124,7 +259,7 @@ Be concise.
 """
         
         try:
-            response = self.client.chat.completions.create(
+            return self._complete(dict(
                 model=OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a concise financial risk analyst. Always provide brief, actionable insights."},
@@ -132,8 +267,7 @@ Be concise.
                 ],
                 max_tokens=200,
                 temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
+            ), no_cache)
         except Exception as e:
             return f"Error generating insights: {e}"
 
@@ -1,13 +1,12 @@
 """
 Main script for EMI Payment Predictor
 """
-import pandas as pd
 import argparse
 import os
-from datetime import datetime
-from predictor import EMIPaymentPredictor
-from llm_explainer import LLMExplainer
-from config import DATA_PATH, MODEL_PATH
+from config import DATA_PATH
+
+# pandas, XGBoost and the OpenAI client are imported by the modes that use them,
+# so the CLI starts (and --help answers) without loading them all
 
 
 def train_model(data_path: str):
@@ -16,6 +15,7 @@ def train_model(data_path: str):
     print("EMI Payment Predictor - Model Training")
     print("=" * 60)
     
+    from predictor import EMIPaymentPredictor
     predictor = EMIPaymentPredictor()
     metrics = predictor.train_model(data_path)
     
@@ -29,6 +29,7 @@ def predict_single_customer(customer_id: str, data_path: str, use_llm: bool = Fa
     print(f"Predicting Payment Date for Customer: {customer_id}")
     print("=" * 60)
     
+    from predictor import EMIPaymentPredictor
     predictor = EMIPaymentPredictor()
     predictor.load_model()
     
@@ -49,6 +50,7 @@ def predict_single_customer(customer_id: str, data_path: str, use_llm: bool = Fa
         print("\n" + "=" * 60)
         print("LLM EXPLANATION")
         print("=" * 60)
+        from llm_explainer import LLMExplainer
         explainer = LLMExplainer()
         explanation = explainer.explain_prediction(result, result['payment_history'])
         print(explanation)
@@ -56,14 +58,20 @@ def predict_single_customer(customer_id: str, data_path: str, use_llm: bool = Fa
     return result
 
 
-def predict_batch(data_path: str, output_path: str = None, use_llm: bool = False):
+def predict_batch(data_path: str, output_path: str = None, use_llm: bool = False,
+                  n_jobs: int = None):
     """Predict payment dates for all customers"""
     print("=" * 60)
     print("Batch Prediction for All Customers")
     print("=" * 60)
     
+    from datetime import datetime
+    from data_processor import EMIDataProcessor
+    from predictor import EMIPaymentPredictor
+    
     # Load data to get all customer IDs
-    df = pd.read_csv(data_path)
+    processor = EMIDataProcessor()
+    df = processor.read_history(data_path, columns=['customer_id'])
     customer_ids = df['customer_id'].unique().tolist()
     
     print(f"Found {len(customer_ids)} customers")
@@ -71,20 +79,25 @@ def predict_batch(data_path: str, output_path: str = None, use_llm: bool = False
     predictor = EMIPaymentPredictor()
     predictor.load_model()
     
-    results_df = predictor.predict_batch(customer_ids, data_path)
-    
-    if output_path:
-        results_df.to_csv(output_path, index=False)
-        print(f"\nResults saved to {output_path}")
-    else:
+    if not output_path:
         output_path = f"predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        results_df.to_csv(output_path, index=False)
-        print(f"\nResults saved to {output_path}")
+    
+    # Predictions are written chunk by chunk as they are computed; only the columns
+    # the summary needs are read back
+    count = processor.write_results_stream(
+        predictor.iter_predict_batch(customer_ids, data_path, n_jobs=n_jobs), output_path)
+    print(f"\nResults saved to {output_path}")
+    
+    if count == 0:
+        print("No predictions could be made")
+        return None
+    results_df = processor.read_results(output_path, columns=[
+        'days_until_payment', 'confidence_score', 'predicted_payment_date', 'average_delay'])
     
     print("\n" + "=" * 60)
     print("SUMMARY STATISTICS")
     print("=" * 60)
-    print(f"Total Predictions: {len(results_df)}")
+    print(f"Total Predictions: {count}")
     print(f"Average Days Until Payment: {results_df['days_until_payment'].mean():.1f}")
     print(f"Average Confidence: {results_df['confidence_score'].mean():.1%}")
     print(f"Earliest Predicted Date: {results_df['predicted_payment_date'].min()}")
@@ -94,6 +107,7 @@ def predict_batch(data_path: str, output_path: str = None, use_llm: bool = False
         print("\n" + "=" * 60)
         print("LLM INSIGHTS")
         print("=" * 60)
+        from llm_explainer import LLMExplainer
         explainer = LLMExplainer()
         insights = explainer.generate_insights(results_df)
         print(insights)
@@ -101,16 +115,30 @@ def predict_batch(data_path: str, output_path: str = None, use_llm: bool = False
     return results_df
 
 
+def serve(data_path: str):
+    """Run the API server on ``data_path``, keeping the model and payment history resident between requests"""
+    import sys
+    import config
+    # The server takes its data path from config: through the environment in gunicorn's
+    # processes, and directly in this one (config is already imported here)
+    os.environ['EMI_DATA_PATH'] = config.DATA_PATH = os.path.abspath(data_path)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from run_backend import main as run_backend
+    run_backend()
+
+
 def main():
     parser = argparse.ArgumentParser(description='EMI Payment Predictor')
-    parser.add_argument('--mode', choices=['train', 'predict', 'batch'], 
-                       default='predict', help='Operation mode')
+    parser.add_argument('--mode', choices=['train', 'predict', 'batch', 'serve'], 
+                       default='predict', help='Operation mode (serve runs the API on --data)')
     parser.add_argument('--data', type=str, default=DATA_PATH,
-                       help='Path to EMI history data CSV')
+                       help='Path to EMI history data (CSV or Parquet)')
     parser.add_argument('--customer-id', type=str,
                        help='Customer ID for single prediction')
     parser.add_argument('--output', type=str,
-                       help='Output file path for batch predictions')
+                       help='Output file path for batch predictions (.csv or .parquet)')
+    parser.add_argument('--jobs', type=int,
+                       help='Worker processes for batch predictions (-1 = all cores)')
     parser.add_argument('--llm', action='store_true',
                        help='Use LLM for explanations (requires OpenAI API key)')
     
@@ -132,7 +160,10 @@ def main():
         predict_single_customer(args.customer_id, args.data, args.llm)
     
     elif args.mode == 'batch':
-        predict_batch(args.data, args.output, args.llm)
+        predict_batch(args.data, args.output, args.llm, args.jobs)
+    
+    elif args.mode == 'serve':
+        serve(args.data)
 
 
 if __name__ == "__main__":
@@ -4,16 +4,29 @@ Main prediction module using ML models and LLM for EMI payment date prediction
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, Optional, Tuple
+import hashlib
 import joblib
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import xgboost as xgb
 
 from data_processor import EMIDataProcessor
-from config import MODEL_PATH, MIN_HISTORY_RECORDS
+from config import MODEL_PATH, MIN_HISTORY_RECORDS, BATCH_WORKERS, BATCH_CHUNK_SIZE, PREDICTION_CACHE_SIZE
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Columns of a customer's history that a prediction depends on (see _prediction_key)
+PREDICTION_INPUT_COLUMNS = ['payment_date', 'scheduled_date', 'delay_days', 'amount']
+
+# Row positions of a customer missing from a groupby(...).indices lookup
+NO_ROWS = np.array([], dtype=np.intp)
 
 
 class EMIPaymentPredictor:
@@ -23,12 +36,16 @@ class EMIPaymentPredictor:
         self.processor = EMIDataProcessor()
         self.model = None
         self.feature_names = None
+        self.feature_index = None  # Feature name -> column of the model's input vector
+        self.model_path = None  # File the current model was loaded from / saved to
+        # LRU of single-customer predictions keyed on the customer's history (see _prediction_key)
+        self._prediction_cache = OrderedDict()
+        self._prediction_cache_lock = threading.Lock()
         
     def train_model(self, data_path: str) -> Dict:
         """Train the prediction model"""
         print("Loading and processing data...")
         df = self.processor.load_data(data_path)
-        df = self.processor.calculate_payment_delays(df)
         
         print("Engineering features...")
         X, y = self.processor.prepare_training_data(df)
@@ -43,19 +60,22 @@ class EMIPaymentPredictor:
         
         # Train XGBoost model
         print("Training model...")
-        self.model = xgb.XGBRegressor(
+        regressor = xgb.XGBRegressor(
             n_estimators=100,
             max_depth=6,
             learning_rate=0.1,
             random_state=42
         )
         
-        self.model.fit(X_train, y_train)
-        self.feature_names = X.columns.tolist()
+        regressor.fit(X_train, y_train)
+        # Predictions go straight to the booster (inplace_predict, no sklearn wrapper)
+        self.model = regressor.get_booster()
+        self._set_feature_names(X.columns.tolist())
+        self.clear_prediction_cache()
         
         # Evaluate
-        y_pred_train = self.model.predict(X_train)
-        y_pred_test = self.model.predict(X_test)
+        y_pred_train = regressor.predict(X_train)
+        y_pred_test = regressor.predict(X_test)
         
         train_mae = mean_absolute_error(y_train, y_pred_train)
         test_mae = mean_absolute_error(y_test, y_pred_test)
@@ -75,186 +95,483 @@ class EMIPaymentPredictor:
         print(f"Train RMSE: {train_rmse:.2f} days")
         print(f"Test RMSE: {test_rmse:.2f} days")
         
-        # Save model
-        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        joblib.dump({
-            'model': self.model,
-            'feature_names': self.feature_names
-        }, MODEL_PATH)
+        # Save model in XGBoost's native JSON format (feature names are stored with it),
+        # under the project root whatever the working directory, where the API loads it from
+        model_path = MODEL_PATH if os.path.isabs(MODEL_PATH) else os.path.join(PROJECT_ROOT, MODEL_PATH)
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        # Write beside the model and swap it in, so processes reloading it never read a partial file
+        root, ext = os.path.splitext(model_path)
+        tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+        self.model.save_model(tmp_path)
+        os.replace(tmp_path, model_path)
+        self.model_path = model_path
         
-        print(f"\nModel saved to {MODEL_PATH}")
+        print(f"\nModel saved to {model_path}")
         
         return metrics
     
     def load_model(self, model_path: Optional[str] = None):
         """Load trained model"""
         # Use provided path or default from config
-        path_to_use = model_path or MODEL_PATH
-        
-        # If relative path, try to resolve from current working directory or script location
-        if not os.path.isabs(path_to_use):
-            # Try current directory first
-            if os.path.exists(path_to_use):
-                path_to_use = os.path.abspath(path_to_use)
-            else:
-                # Try from project root (parent of current file)
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                project_root = script_dir
-                potential_path = os.path.join(project_root, path_to_use)
-                if os.path.exists(potential_path):
-                    path_to_use = potential_path
-                else:
-                    # Try from parent directory (in case running from backend/)
-                    parent_path = os.path.join(os.path.dirname(script_dir), path_to_use)
-                    if os.path.exists(parent_path):
-                        path_to_use = parent_path
+        path_to_use = find_model_path(model_path or MODEL_PATH)
         
         if not os.path.exists(path_to_use):
             raise FileNotFoundError(f"Model not found at {path_to_use}. Please train the model first.")
         
-        model_data = joblib.load(path_to_use)
+        model_data = _cached_load(path_to_use, os.path.getmtime(path_to_use))
         self.model = model_data['model']
-        self.feature_names = model_data['feature_names']
+        self._set_feature_names(model_data['feature_names'])
+        self.model_path = os.path.abspath(path_to_use)
+        self.clear_prediction_cache()
         print("Model loaded successfully")
     
-    def predict_next_payment_date(self, customer_id: str, data_path: str) -> Dict:
-        """Predict next payment date for a customer"""
+    def _set_feature_names(self, feature_names: list):
+        """Set the model's input columns (in training order) and their lookup index"""
+        self.feature_names = feature_names
+        self.feature_index = {name: i for i, name in enumerate(feature_names)}
+    
+    def _load_history(self, data_path: Optional[str], df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Load payment history from disk, or prepare a preloaded DataFrame"""
+        if df is None:
+            return self.processor.load_data(data_path)
+        return self.processor.prepare_data(df)
+    
+    def predict_next_payment_date(self, customer_id: str, data_path: Optional[str] = None,
+                                  df: Optional[pd.DataFrame] = None) -> Dict:
+        """Predict next payment date for a customer
+        
+        Pass a preloaded payment history as ``df`` to skip reading ``data_path``.
+        """
+        if df is None:
+            # Read only this customer's rows from disk
+            customer_df = self.processor.load_customer_data(data_path, customer_id)
+            return self.predict_from_group(customer_df, customer_id)
+        # A one-off lookup: a single scan is cheaper than indexing every customer first
+        return self.predict_from_prepared(customer_id, self.processor.prepare_data(df))
+    
+    def predict_from_prepared(self, customer_id: str, df: pd.DataFrame,
+                              row_indices: Optional[Dict] = None) -> Dict:
+        """Predict next payment date from an already prepared history (see _load_history)
+        
+        Callers predicting many customers from one resident history can pass its
+        ``df.groupby('customer_id').indices`` as ``row_indices``, so the customer's rows
+        are sliced by position instead of found by scanning ``df``.
+        """
+        if row_indices is None:
+            return self.predict_from_group(df[df['customer_id'] == customer_id], customer_id)
+        return self.predict_from_group(df.iloc[row_indices.get(customer_id, NO_ROWS)], customer_id)
+    
+    def predict_from_group(self, customer_df: pd.DataFrame, customer_id: Optional[str] = None) -> Dict:
+        """Predict next payment date from one customer's prepared, date-sorted payment rows
+        
+        ``customer_df`` is typically a group from ``df.groupby('customer_id')``;
+        ``customer_id`` defaults to the id found in those rows.
+        """
         if self.model is None:
             self.load_model()
         
-        # Load customer data
-        df = self.processor.load_data(data_path)
-        df = self.processor.calculate_payment_delays(df)
+        key = self._prediction_key(customer_df, customer_id)
+        with self._prediction_cache_lock:
+            cached = self._prediction_cache.get(key)
+            if cached is not None:
+                self._prediction_cache.move_to_end(key)
+                # Copy so callers can add fields without touching the cached result
+                return dict(cached)
+        
+        state = self._prepare_prediction(customer_df, customer_id)
+        self._apply_demand_dates([state])
+        self._apply_confidence([state])
+        model_days = self.model.inplace_predict(state['X'][np.newaxis])[0] if state['needs_model'] else None
+        result = self._finalize(state, model_days)
+        
+        with self._prediction_cache_lock:
+            self._prediction_cache[key] = result
+            while len(self._prediction_cache) > PREDICTION_CACHE_SIZE:
+                self._prediction_cache.popitem(last=False)
+        return dict(result)
+    
+    def _prediction_key(self, customer_df: pd.DataFrame, customer_id: Optional[str]) -> Tuple:
+        """Cache key for a customer's prediction: a fingerprint of its rows, plus today's date
+        
+        Any change to the customer's history (an added payment, or an edited earlier
+        row) changes the fingerprint, whether the rows came from a file or a DataFrame;
+        the current date matters too (days since last payment feeds the model).
+        """
+        if customer_id is None and len(customer_df) > 0:
+            customer_id = customer_df['customer_id'].iloc[0]
+        # Raw bytes of the columns predictions are computed from (the other derived
+        # columns follow from these)
+        fingerprint = hashlib.blake2b(digest_size=16)
+        for column in PREDICTION_INPUT_COLUMNS:
+            if column in customer_df.columns:
+                values = customer_df[column].to_numpy()
+                fingerprint.update(f"{column}:{values.dtype}".encode())
+                fingerprint.update(np.ascontiguousarray(values).tobytes())
+        return (customer_id, len(customer_df), fingerprint.digest(), datetime.now().date())
+    
+    def clear_prediction_cache(self):
+        """Forget cached single-customer predictions (done automatically when the model changes)"""
+        with self._prediction_cache_lock:
+            self._prediction_cache.clear()
+    
+    def _prepare_prediction(self, customer_df: pd.DataFrame, customer_id: Optional[str] = None,
+                            summary: Optional[Dict] = None) -> Dict:
+        """Everything a prediction needs except the model output (see _finalize)
         
-        customer_df = df[df['customer_id'] == customer_id]
+        ``summary`` holds the customer's average_delay and last_demand_date when a batch
+        has already aggregated them for every customer (see _batch_summaries).
+        """
+        if customer_id is None and len(customer_df) > 0:
+            customer_id = customer_df['customer_id'].iloc[0]
         
         if len(customer_df) < MIN_HISTORY_RECORDS:
             raise ValueError(f"Customer needs at least {MIN_HISTORY_RECORDS} payment records")
         
-        # Engineer features
-        features = self.processor.engineer_features(df, customer_id)
+        # Engineer features (the rows are already this customer's, so no filtering)
+        features = self.processor.engineer_features(customer_df)
         
         if features is None:
             raise ValueError("Could not engineer features for customer")
         
-        # Prepare features for prediction
-        X = features.select_dtypes(include=[np.number]).copy()
-        X = X.drop(columns=['last_payment_date'], errors='ignore')
-        
-        # Ensure feature order matches training
-        X = X.reindex(columns=self.feature_names, fill_value=0)
+        # Feature vector in training column order, as float32 (what XGBoost uses
+        # internally); features missing from this customer stay 0
+        X = np.zeros(len(self.feature_names), dtype=np.float32)
+        for name, value in features.items():
+            index = self.feature_index.get(name)
+            if index is not None:
+                X[index] = value
         
         # Get customer payment history for context
         payment_history = customer_df[['payment_date', 'delay_days']].to_dict('records')
         
-        # Calculate average delay
-        average_delay = customer_df['delay_days'].mean()
-        
-        # Get last demand date (last scheduled_date) and calculate next demand date
-        last_demand_date = None
-        last_demand_date_str = None
-        next_demand_date = None
-        next_demand_date_str = None
-        
-        if 'scheduled_date' in customer_df.columns and len(customer_df) > 0:
-            last_demand_date = customer_df['scheduled_date'].iloc[-1]
-            if pd.notna(last_demand_date):
-                if not isinstance(last_demand_date, pd.Timestamp):
-                    last_demand_date = pd.to_datetime(last_demand_date)
-                last_demand_date_str = last_demand_date.strftime('%Y-%m-%d')
-                
-                # Calculate next demand date: Same day of month, next month
-                # EMI dates are fixed (e.g., 5th, 10th, 15th of each month)
-                # Use the last scheduled date's day of month for the next month
-                day_of_month = last_demand_date.day
-                
-                # Calculate next month
-                if last_demand_date.month == 12:
-                    next_year = last_demand_date.year + 1
-                    next_month = 1
-                else:
-                    next_year = last_demand_date.year
-                    next_month = last_demand_date.month + 1
-                
-                # Handle cases where day doesn't exist in next month (e.g., Jan 31 -> Feb 28/29)
-                try:
-                    next_demand_date = pd.Timestamp(year=next_year, month=next_month, day=day_of_month)
-                except ValueError:
-                    # If day doesn't exist (e.g., Feb 31), use last day of month
-                    from calendar import monthrange
-                    last_day = monthrange(next_year, next_month)[1]
-                    next_demand_date = pd.Timestamp(year=next_year, month=next_month, day=min(day_of_month, last_day))
-                
-                next_demand_date_str = next_demand_date.strftime('%Y-%m-%d')
-        
-        # Calculate predicted date: Next Demand Date + Average Delay
+        # Average delay and last demand date (last scheduled_date); the next demand
+        # date is filled in by _apply_demand_dates
+        if summary is None:
+            summary = {'average_delay': customer_df['delay_days'].mean()}
+            if 'scheduled_date' in customer_df.columns:
+                summary['last_demand_date'] = customer_df['scheduled_date'].iloc[-1]
+        average_delay = summary['average_delay']
+        last_demand_date = summary.get('last_demand_date')
+        if pd.isna(last_demand_date):
+            last_demand_date = None
+        
+        return {
+            'customer_id': customer_id,
+            'customer_df': customer_df,
+            'features': features,
+            'X': X,
+            'payment_history': payment_history,
+            'average_delay': average_delay,
+            'last_demand_date': last_demand_date,
+            'last_demand_date_str': None,
+            'next_demand_date_str': None,
+            'predicted_date': None,
+            # The model is only consulted when there is no demand date to anchor on
+            'needs_model': last_demand_date is None
+        }
+    
+    def _apply_demand_dates(self, states: list):
+        """Fill next demand and demand-anchored predicted dates for prepared states in one vectorized pass"""
+        anchored = [state for state in states if state is not None and not state['needs_model']]
+        if not anchored:
+            return
+        
+        last_demand = pd.DatetimeIndex([state['last_demand_date'] for state in anchored]).to_numpy()
+        last_demand = last_demand.astype('datetime64[D]')
+        
+        # Next demand date: same day of month, next month. EMI dates are fixed (e.g. 5th,
+        # 10th, 15th); days the next month lacks are clamped to its last day
+        # (Jan 31 -> Feb 28/29). Month arithmetic on datetime64[M], no per-row branches.
+        this_month = last_demand.astype('datetime64[M]')
+        day_offset = (last_demand - this_month.astype('datetime64[D]')).astype(np.int64)
+        next_month = (this_month + 1).astype('datetime64[D]')
+        next_month_days = ((this_month + 2).astype('datetime64[D]') - next_month).astype(np.int64)
+        next_demand = pd.DatetimeIndex(next_month + np.minimum(day_offset, next_month_days - 1))
+        last_demand = pd.DatetimeIndex(last_demand)
+        
+        # Predicted date: next demand date + average delay (rounded to whole days).
         # This makes business sense - if customer pays 4 days late on average,
         # they'll pay 4 days after the demand date
-        if next_demand_date is not None:
-            # Round average delay to nearest integer for date calculation
-            delay_days = int(round(average_delay))
-            predicted_date = next_demand_date + timedelta(days=delay_days)
+        average_delays = np.array([state['average_delay'] for state in anchored], dtype=float)
+        predicted = next_demand + pd.to_timedelta(np.round(average_delays), unit='D')
+        
+        for state, last_str, next_str, predicted_date in zip(
+                anchored, last_demand.strftime('%Y-%m-%d'), next_demand.strftime('%Y-%m-%d'), predicted):
+            state['last_demand_date_str'] = last_str
+            state['next_demand_date_str'] = next_str
+            state['predicted_date'] = predicted_date
+    
+    def _finalize(self, state: Dict, model_days: Optional[float] = None) -> Dict:
+        """Build the prediction result from _prepare_prediction's state and the model output"""
+        features = state['features']
+        average_delay = state['average_delay']
+        
+        if not state['needs_model']:
+            # Next demand date + average delay, see _apply_demand_dates
+            predicted_date = state['predicted_date']
+            if pd.isna(predicted_date):
+                raise ValueError("Could not compute average delay for customer")
         else:
             # Fallback: Use ML model prediction if no demand date available
-            days_until_payment = self.model.predict(X)[0]
-            days_until_payment = max(0, int(round(days_until_payment)))
-            last_payment_date = features['last_payment_date'].iloc[0]
-            if isinstance(last_payment_date, pd.Timestamp):
-                predicted_date = last_payment_date + timedelta(days=int(days_until_payment))
-            else:
-                predicted_date = pd.to_datetime(last_payment_date) + timedelta(days=int(days_until_payment))
-        
-        # Calculate days until payment for display
-        last_payment_date = features['last_payment_date'].iloc[0]
-        if isinstance(last_payment_date, pd.Timestamp):
-            days_until_payment = (predicted_date - last_payment_date).days
-        else:
-            days_until_payment = (predicted_date - pd.to_datetime(last_payment_date)).days
+            days_until_payment = max(0, int(round(model_days)))
+            predicted_date = features['last_payment_date'] + timedelta(days=days_until_payment)
+        
+        # Calculate days until payment for display (dates are Timestamps, see prepare_data)
+        last_payment_date = features['last_payment_date']
+        days_until_payment = (predicted_date - last_payment_date).days
         
         result = {
-            'customer_id': customer_id,
+            'customer_id': state['customer_id'],
             'predicted_payment_date': predicted_date.strftime('%Y-%m-%d'),
             'days_until_payment': days_until_payment,
-            'last_payment_date': last_payment_date.strftime('%Y-%m-%d') if hasattr(last_payment_date, 'strftime') else str(last_payment_date),
-            'last_demand_date': last_demand_date_str,
-            'next_demand_date': next_demand_date_str,
-            'confidence_score': self._calculate_confidence(features),
-            'payment_history': payment_history[-5:],  # Last 5 payments
+            'last_payment_date': last_payment_date.strftime('%Y-%m-%d'),
+            'last_demand_date': state['last_demand_date_str'],
+            'next_demand_date': state['next_demand_date_str'],
+            'confidence_score': state['confidence_score'],
+            'payment_history': state['payment_history'][-5:],  # Last 5 payments
             'average_delay': average_delay,
-            'payment_count': len(customer_df)
+            'payment_count': len(state['customer_df'])
         }
         
         return result
     
-    def _calculate_confidence(self, features: pd.DataFrame) -> float:
-        """Calculate confidence score based on data quality"""
-        confidence = 0.7  # Base confidence
+    def _confidence_scores(self, total_payments: np.ndarray, std_delays: np.ndarray) -> np.ndarray:
+        """Calculate confidence scores based on data quality, for many customers at once"""
+        confidence = np.full(len(total_payments), 0.7)  # Base confidence
         
         # Increase confidence with more data
-        if features['total_payments'].iloc[0] > 10:
-            confidence += 0.1
-        elif features['total_payments'].iloc[0] > 5:
-            confidence += 0.05
+        confidence += np.where(total_payments > 10, 0.1, np.where(total_payments > 5, 0.05, 0.0))
         
         # Decrease confidence with high variance
-        if features['std_delay'].iloc[0] > 10:
-            confidence -= 0.1
-        elif features['std_delay'].iloc[0] < 3:
-            confidence += 0.1
+        confidence += np.where(std_delays > 10, -0.1, np.where(std_delays < 3, 0.1, 0.0))
         
-        return min(0.95, max(0.5, confidence))
+        return np.clip(confidence, 0.5, 0.95)
+    
+    def _apply_confidence(self, states: list):
+        """Fill the confidence score of prepared states in one vectorized pass"""
+        scored = [state for state in states if state is not None]
+        if not scored:
+            return
+        total_payments = np.array([state['features']['total_payments'] for state in scored], dtype=float)
+        std_delays = np.array([state['features']['std_delay'] for state in scored], dtype=float)
+        scores = self._confidence_scores(total_payments, std_delays)
+        for state, score in zip(scored, scores.tolist()):
+            state['confidence_score'] = score
     
-    def predict_batch(self, customer_ids: list, data_path: str) -> pd.DataFrame:
-        """Predict for multiple customers"""
+    def _prepare_or_none(self, customer_id: str, customer_df: pd.DataFrame,
+                         summary: Optional[Dict] = None) -> Optional[Dict]:
+        """Prepare one customer of a batch, reporting and skipping failures"""
+        try:
+            return self._prepare_prediction(customer_df, customer_id, summary)
+        except Exception as e:
+            print(f"Error predicting for customer {customer_id}: {str(e)}")
+            return None
+    
+    def _predict_many(self, customer_ids: list, customer_frames: list,
+                      summaries: Optional[list] = None) -> list:
+        """Predict several customers with a single model call (None for customers that fail)
+        
+        ``summaries`` optionally gives each customer's _batch_summaries entry.
+        """
+        summaries = summaries or [None] * len(customer_ids)
+        states = [self._prepare_or_none(customer_id, customer_df, summary)
+                  for customer_id, customer_df, summary in zip(customer_ids, customer_frames, summaries)]
+        self._apply_demand_dates(states)
+        self._apply_confidence(states)
+        
+        # Stack the feature rows of every customer that needs the model into one matrix
+        pending = [i for i, state in enumerate(states) if state is not None and state['needs_model']]
+        model_days = {}
+        if pending:
+            X = np.vstack([states[i]['X'] for i in pending])
+            model_days = dict(zip(pending, self.model.inplace_predict(X)))
+        
         results = []
+        for i, state in enumerate(states):
+            result = None
+            if state is not None:
+                try:
+                    result = self._finalize(state, model_days.get(i))
+                except Exception as e:
+                    print(f"Error predicting for customer {state['customer_id']}: {str(e)}")
+            results.append(result)
+        return results
+    
+    def predict_batch(self, customer_ids: list, data_path: Optional[str] = None,
+                      df: Optional[pd.DataFrame] = None, n_jobs: Optional[int] = None,
+                      prepared: Optional[pd.DataFrame] = None, row_indices: Optional[Dict] = None) -> pd.DataFrame:
+        """Predict for multiple customers
+        
+        ``n_jobs`` worker processes share the batch (-1 = all cores); it defaults
+        to BATCH_WORKERS from config, and 1 runs serially in this process.
+        Callers holding an already prepared history can pass it as ``prepared``
+        (with its ``groupby('customer_id').indices`` as ``row_indices``, if kept)
+        instead of ``df``, so it is not prepared again.
+        """
+        # Each distinct customer is predicted once; repeated ids reuse that result
+        results_by_id = {}
+        for chunk_ids, results in self._iter_batch_results(customer_ids, data_path, df, n_jobs,
+                                                           prepared=prepared, row_indices=row_indices):
+            results_by_id.update(zip(chunk_ids, results))
+        return pd.DataFrame([results_by_id[customer_id] for customer_id in customer_ids
+                             if results_by_id[customer_id] is not None])
+    
+    def iter_predict_batch(self, customer_ids: list, data_path: Optional[str] = None,
+                           df: Optional[pd.DataFrame] = None, n_jobs: Optional[int] = None,
+                           chunk_size: int = BATCH_CHUNK_SIZE, prepared: Optional[pd.DataFrame] = None,
+                           row_indices: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+        """Predict for multiple customers, yielding DataFrames of up to ``chunk_size`` predictions
+        
+        Distinct customers are predicted once each, in order of first appearance, so
+        results can be written out while the rest are computed (see
+        EMIDataProcessor.write_results_stream). Other arguments are as for predict_batch.
+        """
+        for _, results in self._iter_batch_results(customer_ids, data_path, df, n_jobs, chunk_size,
+                                                   prepared, row_indices):
+            yield pd.DataFrame([result for result in results if result is not None])
+    
+    def _iter_batch_results(self, customer_ids: list, data_path: Optional[str], df: Optional[pd.DataFrame],
+                            n_jobs: Optional[int], chunk_size: Optional[int] = None,
+                            prepared: Optional[pd.DataFrame] = None,
+                            row_indices: Optional[Dict] = None) -> Iterator[Tuple[list, list]]:
+        """Yield (distinct customer ids, results or None) for successive chunks of a batch"""
+        n_jobs = BATCH_WORKERS if n_jobs is None else n_jobs
+        if n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        
+        # Read and prepare the history once for the whole batch, then index its rows by
+        # customer in one pass instead of scanning it for every customer
+        df = prepared if prepared is not None else self._load_history(data_path, df)
+        grouped = df.groupby('customer_id', sort=False, observed=True)
+        if row_indices is None:
+            row_indices = grouped.indices
+        summaries = self._batch_summaries(grouped)
+        
+        def customer_frames(ids: list) -> list:
+            # Only the requested customers' rows are gathered, one chunk at a time
+            return [df.iloc[row_indices.get(customer_id, NO_ROWS)] for customer_id in ids]
+        
+        def customer_summaries(ids: list) -> list:
+            return [summaries.get(customer_id) for customer_id in ids]
+        
+        unique_ids = list(dict.fromkeys(customer_ids))
+        chunk_size = chunk_size or max(1, len(unique_ids))
+        chunks = (unique_ids[start:start + chunk_size] for start in range(0, len(unique_ids), chunk_size))
         
-        for customer_id in customer_ids:
-            try:
-                result = self.predict_next_payment_date(customer_id, data_path)
-                results.append(result)
-            except Exception as e:
-                print(f"Error predicting for customer {customer_id}: {str(e)}")
-                continue
+        if self.model is None:
+            self.load_model()
         
-        return pd.DataFrame(results)
+        # No point starting more workers than there are customers
+        n_jobs = min(n_jobs, len(unique_ids))
+        if n_jobs > 1:
+            # Workers load a saved model from disk themselves; an unsaved one is sent over
+            worker_args = ((self.model_path, None, None) if self.model_path
+                           else (None, self.model, self.feature_names))
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_batch_worker,
+                                     initargs=worker_args) as executor:
+                for chunk_ids in chunks:
+                    # Each task is a slice of customers, predicted with one model call
+                    step = max(1, -(-len(chunk_ids) // (4 * n_jobs)))
+                    id_slices = [chunk_ids[i:i + step] for i in range(0, len(chunk_ids), step)]
+                    frame_slices = [customer_frames(ids) for ids in id_slices]
+                    summary_slices = [customer_summaries(ids) for ids in id_slices]
+                    yield chunk_ids, [result
+                                      for part in executor.map(_predict_chunk_in_worker, id_slices,
+                                                               frame_slices, summary_slices)
+                                      for result in part]
+        else:
+            for chunk_ids in chunks:
+                yield chunk_ids, self._predict_many(chunk_ids, customer_frames(chunk_ids),
+                                                    customer_summaries(chunk_ids))
+    
+    def _batch_summaries(self, grouped) -> Dict:
+        """Per-customer average_delay and last_demand_date for a whole batch, aggregated in one pass
+        
+        ``grouped`` is the batch history grouped by customer_id. Saves scanning every
+        customer's rows again for these scalars.
+        """
+        summaries = grouped.agg(average_delay=('delay_days', 'mean'))
+        if 'scheduled_date' in grouped.obj.columns:
+            # The last row's date even when it is missing, as in _prepare_prediction
+            # (plain 'last' would skip back to an earlier one)
+            summaries['last_demand_date'] = grouped['scheduled_date'].last(skipna=False)
+        # Keep numpy scalars, so a float32 average stays float32 as it is from Series.mean
+        columns = [summaries[name].to_numpy() for name in summaries.columns]
+        return {customer_id: dict(zip(summaries.columns, values))
+                for customer_id, *values in zip(summaries.index, *columns)}
+
+
+def _resolve_model_path(path: str) -> str:
+    """Resolve a relative model path against the working directory, then the project root and its parent"""
+    if os.path.isabs(path):
+        return path
+    # Try current directory first
+    if os.path.exists(path):
+        return os.path.abspath(path)
+    # Try from project root (the directory of this file)
+    potential_path = os.path.join(PROJECT_ROOT, path)
+    if os.path.exists(potential_path):
+        return potential_path
+    # Try from parent directory (in case running from backend/)
+    parent_path = os.path.join(os.path.dirname(PROJECT_ROOT), path)
+    if os.path.exists(parent_path):
+        return parent_path
+    return path
+
+
+def find_model_path(model_path: str = MODEL_PATH) -> str:
+    """Path of the saved model to load for ``model_path`` (which may not exist)
+    
+    When an XGBoost ``.json`` model is missing, a joblib ``.pkl`` model saved beside
+    it by an older version of this project is used instead.
+    """
+    path = _resolve_model_path(model_path)
+    if not os.path.exists(path) and path.endswith('.json'):
+        legacy_path = _resolve_model_path(os.path.splitext(model_path)[0] + '.pkl')
+        if os.path.exists(legacy_path):
+            print(f"Using legacy model {legacy_path}; retrain to save it in the current format")
+            return legacy_path
+    return path
+
+
+@lru_cache(maxsize=4)
+def _cached_load(path: str, mtime: float) -> Dict:
+    """Deserialize a saved model file, once per path and modification time
+    
+    Reads XGBoost JSON/UBJSON models, and joblib pickles from older versions of
+    this project (``{'model': XGBRegressor, 'feature_names': [...]}``).
+    """
+    if path.endswith('.pkl'):
+        model_data = joblib.load(path)
+        model = model_data['model']
+        return {'model': model.get_booster() if hasattr(model, 'get_booster') else model,
+                'feature_names': model_data['feature_names']}
+    booster = xgb.Booster()
+    booster.load_model(path)
+    return {'model': booster, 'feature_names': booster.feature_names}
+
+
+# Per-process predictor for parallel batch predictions, set once by _init_batch_worker
+_worker_predictor = None
+
+
+def _init_batch_worker(model_path: Optional[str], model, feature_names):
+    """Process pool initializer: load (or keep) the model once in a worker global"""
+    global _worker_predictor
+    _worker_predictor = EMIPaymentPredictor()
+    if model_path:
+        # Forked workers inherit the parent's _cached_load entry, so this is a cache hit
+        # and the booster's pages stay shared copy-on-write; only spawned workers read the file
+        model_data = _cached_load(model_path, os.path.getmtime(model_path))
+        model, feature_names = model_data['model'], model_data['feature_names']
+    # The pool already spreads work over the cores; XGBoost threads inside every
+    # worker would only oversubscribe them
+    model.set_param({'nthread': 1})
+    _worker_predictor.model = model
+    _worker_predictor._set_feature_names(feature_names)
+    _worker_predictor.model_path = model_path
+
 
+def _predict_chunk_in_worker(customer_ids: list, customer_frames: list, summaries: list) -> list:
+    """Predict a slice of a batch inside a worker process"""
+    return _worker_predictor._predict_many(customer_ids, customer_frames, summaries)
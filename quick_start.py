@@ -39,8 +39,8 @@ def main():
     # Step 3: Make prediction
     print("\n[Step 3/3] Making sample prediction...")
     try:
-        import pandas as pd
-        df = pd.read_csv("data/emi_history.csv")
+        from data_processor import EMIDataProcessor
+        df = EMIDataProcessor().read_history("data/emi_history.csv", columns=['customer_id'])
         sample_customer = df['customer_id'].iloc[0]
         
         result = predictor.predict_next_payment_date(sample_customer, "data/emi_history.csv")
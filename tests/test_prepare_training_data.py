@@ -0,0 +1,116 @@
+"""
+Regression test: the vectorized prepare_training_data against the original per-prefix loop
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processor import EMIDataProcessor
+from config import DATA_PATH
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reference_features(customer_df: pd.DataFrame, feature_windows: list) -> dict:
+    """Features of one payment prefix, as the original engineer_features computed them"""
+    features = {}
+
+    features['total_payments'] = len(customer_df)
+    features['avg_delay'] = customer_df['delay_days'].mean()
+    features['std_delay'] = customer_df['delay_days'].std()
+    features['max_delay'] = customer_df['delay_days'].max()
+    features['min_delay'] = customer_df['delay_days'].min()
+
+    recent_payments = customer_df.tail(3)
+    features['recent_avg_delay'] = recent_payments['delay_days'].mean()
+    features['recent_trend'] = recent_payments['delay_days'].diff().mean()
+
+    payment_intervals = customer_df['payment_date'].diff().dt.days.dropna()
+    features['avg_interval'] = payment_intervals.mean()
+    features['interval_std'] = payment_intervals.std()
+
+    features['preferred_day'] = customer_df['payment_date'].dt.dayofweek.mode()[0]
+    features['preferred_month'] = customer_df['payment_date'].dt.month.mode()[0]
+
+    for window in feature_windows:
+        window_df = customer_df[customer_df['payment_date'] >=
+                                customer_df['payment_date'].max() - timedelta(days=window)]
+        features[f'delay_mean_{window}d'] = window_df['delay_days'].mean()
+        features[f'payment_count_{window}d'] = len(window_df)
+
+    last_payment = customer_df.iloc[-1]
+    features['last_delay'] = last_payment['delay_days']
+    features['days_since_last_payment'] = (datetime.now() - last_payment['payment_date']).days
+
+    if 'amount' in customer_df.columns:
+        features['avg_amount'] = customer_df['amount'].mean()
+        features['last_amount'] = last_payment['amount']
+
+    return features
+
+
+def reference_training_data(df: pd.DataFrame, feature_windows: list) -> tuple:
+    """The original prefix loop: one sample per payment after the first two of each customer"""
+    X_list = []
+    y_list = []
+    for _, customer_df in df.groupby('customer_id', sort=False, observed=True):
+        if len(customer_df) < 3:
+            continue
+        for i in range(2, len(customer_df)):
+            historical = customer_df.iloc[:i]
+            target = customer_df.iloc[i]
+            if i < len(customer_df) - 1:
+                days_until_next = (customer_df.iloc[i + 1]['payment_date'] - target['payment_date']).days
+            else:
+                days_until_next = (target['payment_date'] - historical.iloc[-1]['payment_date']).days
+            X_list.append(reference_features(historical, feature_windows))
+            y_list.append(days_until_next)
+    return pd.DataFrame(X_list), np.array(y_list)
+
+
+def random_history(seed: int, customers: int = 40) -> pd.DataFrame:
+    """Payment histories of varying length, with gaps, early/late payments and same-day repeats"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for c in range(customers):
+        start = pd.Timestamp('2023-01-01') + pd.Timedelta(days=int(rng.integers(0, 300)))
+        for k in range(int(rng.integers(1, 15))):
+            scheduled = start + pd.DateOffset(months=k)
+            paid = scheduled + pd.Timedelta(days=int(rng.integers(-10, 40)))
+            rows.append({'customer_id': f'CUST_{c:04d}', 'payment_date': paid, 'scheduled_date': scheduled,
+                         'amount': float(rng.choice([5000.0, 7500.5, 12000.25])), 'payment_status': 'paid'})
+    return pd.DataFrame(rows).sample(frac=1, random_state=seed)
+
+
+class PrepareTrainingDataTest(unittest.TestCase):
+
+    def assert_matches_reference(self, raw: pd.DataFrame):
+        processor = EMIDataProcessor()
+        df = processor.prepare_data(raw)
+        X, y = processor.prepare_training_data(df)
+        X_ref, y_ref = reference_training_data(df, processor.feature_windows)
+
+        np.testing.assert_array_equal(y, y_ref)
+        self.assertEqual(sorted(X.columns), sorted(X_ref.columns))
+        for column in X_ref.columns:
+            # Amounts are float32 after prepare_data, so their means may differ in the last bits
+            np.testing.assert_allclose(X[column].to_numpy(dtype=float), X_ref[column].to_numpy(dtype=float),
+                                       rtol=1e-6, equal_nan=True, err_msg=column)
+
+    def test_bundled_data(self):
+        self.assert_matches_reference(pd.read_csv(os.path.join(PROJECT_ROOT, DATA_PATH)))
+
+    def test_random_histories(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self.assert_matches_reference(random_history(seed))
+
+
+if __name__ == '__main__':
+    unittest.main()